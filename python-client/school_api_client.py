@@ -12,8 +12,10 @@ Version: 1.0.0
 import requests
 import json
 import time
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any, Union
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Any, Union
 from urllib.parse import urljoin, urlencode
 import logging
 
@@ -289,6 +291,183 @@ class SchoolAPIClient:
         return self._make_request('DELETE', '/api/sync/cleanup', data=data)
 
 
+def attendance_key(record: dict) -> Optional[tuple]:
+    """Natural key for attendance records: roll number + date"""
+    roll_number = record.get('studentRollNumber')
+    date = record.get('date')
+    if not roll_number or not date:
+        return None
+    return (roll_number, date)
+
+
+def student_key(record: dict) -> Optional[tuple]:
+    """Natural key for student records: roll number, falling back to email"""
+    if record.get('rollNumber'):
+        return ('rollNumber', record['rollNumber'])
+    if record.get('email'):
+        return ('email', record['email'].strip().lower())
+    return None
+
+
+class RecordCompactor:
+    """Collapse duplicate sync records by natural key before upload.
+
+    Records are consumed lazily and compacted within a window of at most
+    ``window_size`` distinct keys, so memory stays bounded regardless of
+    input size. The timestamp of every emitted key is remembered (up to
+    ``max_tracked_keys``, least recently used first out) so that a stale
+    edit arriving in a later window is dropped instead of overwriting a
+    newer one on the server. Under ``LAST_WRITER_WINS`` an edit with the
+    same timestamp as the emitted version is dropped as well. Under
+    ``FIELD_MERGE`` null fields are left out of emitted records, so a
+    partial edit in a later window never clears values sent earlier.
+
+    Staleness tracking covers a single ``compact()`` call and is reset on
+    the next one, so retrying a feed after failed uploads resends it.
+    """
+
+    LAST_WRITER_WINS = 'last_writer_wins'
+    FIELD_MERGE = 'field_merge'
+    POLICIES = (LAST_WRITER_WINS, FIELD_MERGE)
+
+    def __init__(self, key_func: Callable[[dict], Optional[tuple]],
+                 policy: str = LAST_WRITER_WINS,
+                 timestamp_field: str = 'updatedAt',
+                 window_size: int = 1000,
+                 max_tracked_keys: int = 10000):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown conflict policy: {policy}")
+        if window_size < 1:
+            raise ValueError("window_size must be at least 1")
+        if max_tracked_keys < 0:
+            raise ValueError("max_tracked_keys must not be negative")
+        self.key_func = key_func
+        self.policy = policy
+        self.timestamp_field = timestamp_field
+        self.window_size = window_size
+        self.max_tracked_keys = max_tracked_keys
+        self.stats = {'input': 0, 'output': 0, 'collapsed': 0}
+        self._emitted: 'OrderedDict[tuple, Optional[datetime]]' = OrderedDict()
+
+    @classmethod
+    def for_attendance(cls, **kwargs) -> 'RecordCompactor':
+        """Compactor keyed on studentRollNumber + date"""
+        return cls(attendance_key, **kwargs)
+
+    @classmethod
+    def for_students(cls, **kwargs) -> 'RecordCompactor':
+        """Compactor keyed on rollNumber, or email when no roll number is set"""
+        return cls(student_key, **kwargs)
+
+    def compact(self, records: Iterable[dict]) -> Iterator[dict]:
+        """Yield compacted records; ``stats`` is complete once exhausted"""
+        self.stats = {'input': 0, 'output': 0, 'collapsed': 0}
+        self._emitted.clear()
+        window: 'OrderedDict[tuple, dict]' = OrderedDict()
+
+        for record in records:
+            self.stats['input'] += 1
+            key = self.key_func(record)
+            if key is None:
+                # Records without a natural key cannot be deduplicated
+                self.stats['output'] += 1
+                yield record
+                continue
+
+            # Checked for every record, as the window entry for this key
+            # may lack a timestamp and defer to arrival order in _resolve
+            if self._is_stale(key, record):
+                self.stats['collapsed'] += 1
+                continue
+
+            if key in window:
+                window[key] = self._resolve(window[key], record)
+                self.stats['collapsed'] += 1
+                continue
+
+            if len(window) >= self.window_size:
+                yield from self._flush(window)
+            window[key] = record
+
+        yield from self._flush(window)
+
+    def _flush(self, window: 'OrderedDict[tuple, dict]') -> Iterator[dict]:
+        """Emit the current window in first-seen order and clear it"""
+        for key, record in window.items():
+            self._remember(key, self._timestamp(record))
+            if self.policy == self.FIELD_MERGE:
+                record = {field: value for field, value in record.items() if value is not None}
+            self.stats['output'] += 1
+            yield record
+        window.clear()
+
+    def _remember(self, key: tuple, timestamp: Optional[datetime]):
+        """Track the newest emitted timestamp for a key, evicting the oldest keys"""
+        previous = self._emitted.pop(key, None)
+        if previous is not None and (timestamp is None or previous > timestamp):
+            timestamp = previous
+        self._emitted[key] = timestamp
+        while len(self._emitted) > self.max_tracked_keys:
+            self._emitted.popitem(last=False)
+
+    def _is_stale(self, key: tuple, record: dict) -> bool:
+        """Check if a newer version of this key was already emitted"""
+        if key not in self._emitted:
+            return False
+        self._emitted.move_to_end(key)
+        emitted = self._emitted[key]
+        timestamp = self._timestamp(record)
+        if emitted is None or timestamp is None:
+            return False
+        if self.policy == self.LAST_WRITER_WINS:
+            return timestamp <= emitted
+        return timestamp < emitted
+
+    def _resolve(self, current: dict, incoming: dict) -> dict:
+        """Resolve two records sharing a key according to the conflict policy"""
+        current_ts = self._timestamp(current)
+        incoming_ts = self._timestamp(incoming)
+        # Without comparable timestamps, arrival order decides
+        if current_ts is not None and incoming_ts is not None and incoming_ts < current_ts:
+            older, newer = incoming, current
+        else:
+            older, newer = current, incoming
+
+        if self.policy == self.LAST_WRITER_WINS:
+            return newer
+
+        merged = dict(older)
+        merged.update({field: value for field, value in newer.items() if value is not None})
+        return merged
+
+    def _timestamp(self, record: dict) -> Optional[datetime]:
+        """Parse the record's timestamp field, if present"""
+        value = record.get(self.timestamp_field)
+        if value is None:
+            return None
+        if isinstance(value, datetime):
+            parsed = value
+        elif isinstance(value, (int, float)):
+            # Epoch values this large are milliseconds, as JS backends emit
+            if abs(value) >= 1e11:
+                value = value / 1000
+            try:
+                parsed = datetime.fromtimestamp(value, timezone.utc)
+            except (ValueError, OverflowError, OSError):
+                logger.warning("Ignoring out of range %s: %r", self.timestamp_field, value)
+                return None
+        else:
+            try:
+                parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+            except ValueError:
+                logger.warning("Ignoring unparseable %s: %r", self.timestamp_field, value)
+                return None
+        # Normalise to naive UTC so aware and naive values compare
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+        return parsed
+
+
 class BatchProcessor:
     """Helper class for batch processing operations"""
 
@@ -296,28 +475,51 @@ class BatchProcessor:
         self.client = client
         self.batch_size = batch_size
 
-    def process_students_batch(self, students: List[dict]) -> dict:
-        """Process students in batches"""
-        results = {'created': 0, 'updated': 0, 'errors': []}
-
-        for i in range(0, len(students), self.batch_size):
-            batch = students[i:i + self.batch_size]
+    def _iter_batches(self, records: Iterable[dict]) -> Iterator[List[dict]]:
+        """Split an iterable of records into lists of at most batch_size"""
+        iterator = iter(records)
+        while True:
+            batch = list(islice(iterator, self.batch_size))
+            if not batch:
+                return
+            yield batch
+
+    def process_students_batch(self, students: Iterable[dict],
+                               compactor: Optional[RecordCompactor] = None) -> dict:
+        """Process students in batches, optionally compacting duplicates first.
+
+        ``collapsed`` reflects the whole input only if every batch was sent;
+        an unexpected exception mid-run leaves the compactor stats partial.
+        """
+        results = {'created': 0, 'updated': 0, 'collapsed': 0, 'errors': []}
+        if compactor is not None:
+            students = compactor.compact(students)
+
+        for number, batch in enumerate(self._iter_batches(students), start=1):
             try:
                 batch_result = self.client.sync_students(batch)
                 results['created'] += batch_result.get('created', 0)
                 results['updated'] += batch_result.get('updated', 0)
                 results['errors'].extend(batch_result.get('errors', []))
             except SchoolAPIError as e:
-                results['errors'].append(f"Batch {i//self.batch_size + 1}: {str(e)}")
+                results['errors'].append(f"Batch {number}: {str(e)}")
 
+        if compactor is not None:
+            results['collapsed'] = compactor.stats['collapsed']
         return results
 
-    def process_attendance_batch(self, attendance_records: List[dict]) -> dict:
-        """Process attendance records in batches"""
-        results = {'created': 0, 'updated': 0, 'skipped': 0, 'errors': []}
+    def process_attendance_batch(self, attendance_records: Iterable[dict],
+                                 compactor: Optional[RecordCompactor] = None) -> dict:
+        """Process attendance records in batches, optionally compacting duplicates first.
+
+        ``collapsed`` reflects the whole input only if every batch was sent;
+        an unexpected exception mid-run leaves the compactor stats partial.
+        """
+        results = {'created': 0, 'updated': 0, 'skipped': 0, 'collapsed': 0, 'errors': []}
+        if compactor is not None:
+            attendance_records = compactor.compact(attendance_records)
 
-        for i in range(0, len(attendance_records), self.batch_size):
-            batch = attendance_records[i:i + self.batch_size]
+        for number, batch in enumerate(self._iter_batches(attendance_records), start=1):
             try:
                 batch_result = self.client.sync_attendance(batch)
                 results['created'] += batch_result.get('created', 0)
@@ -325,8 +527,10 @@ class BatchProcessor:
                 results['skipped'] += batch_result.get('skipped', 0)
                 results['errors'].extend(batch_result.get('errors', []))
             except SchoolAPIError as e:
-                results['errors'].append(f"Batch {i//self.batch_size + 1}: {str(e)}")
+                results['errors'].append(f"Batch {number}: {str(e)}")
 
+        if compactor is not None:
+            results['collapsed'] = compactor.stats['collapsed']
         return results
 
 
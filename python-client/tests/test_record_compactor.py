@@ -0,0 +1,271 @@
+"""
+Tests for RecordCompactor and compacted batch processing
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from school_api_client import BatchProcessor, RecordCompactor, SchoolAPIError
+
+
+def attendance(roll_number, status, updated_at=None, **fields):
+    record = {'studentRollNumber': roll_number, 'date': '2024-01-15', 'status': status}
+    if updated_at is not None:
+        record['updatedAt'] = updated_at
+    record.update(fields)
+    return record
+
+
+class StubClient:
+    """Records uploaded batches instead of calling the API"""
+
+    def __init__(self, fail_batches=()):
+        self.batches = []
+        self.fail_batches = fail_batches
+
+    def sync_attendance(self, batch):
+        self.batches.append(batch)
+        if len(self.batches) in self.fail_batches:
+            raise SchoolAPIError("Server unavailable", 503)
+        return {'created': len(batch), 'updated': 0, 'skipped': 0, 'errors': []}
+
+    def sync_students(self, batch):
+        self.batches.append(batch)
+        if len(self.batches) in self.fail_batches:
+            raise SchoolAPIError("Server unavailable", 503)
+        return {'created': len(batch), 'updated': 0, 'errors': []}
+
+
+def test_last_writer_wins_within_window():
+    compactor = RecordCompactor.for_attendance()
+    records = [
+        attendance('A', 'absent', '2024-01-15T08:00:00Z'),
+        attendance('A', 'present', '2024-01-15T10:00:00Z'),
+        attendance('A', 'late', '2024-01-15T09:00:00Z'),
+    ]
+
+    output = list(compactor.compact(records))
+
+    assert [r['status'] for r in output] == ['present']
+    assert compactor.stats == {'input': 3, 'output': 1, 'collapsed': 2}
+
+
+def test_last_writer_wins_drops_stale_edits_across_windows():
+    compactor = RecordCompactor.for_attendance(window_size=1)
+    records = [
+        attendance('A', 'present', '2024-01-15T10:00:00Z'),
+        attendance('B', 'present'),
+        attendance('A', 'late', '2024-01-15T09:00:00Z'),
+        attendance('A', 'present', '2024-01-15T10:00:00Z'),
+    ]
+
+    output = list(compactor.compact(records))
+
+    assert [(r['studentRollNumber'], r['status']) for r in output] == [('A', 'present'), ('B', 'present')]
+    assert compactor.stats['collapsed'] == 2
+
+
+def test_stale_edit_after_untimestamped_window_entry_is_dropped():
+    compactor = RecordCompactor.for_attendance(window_size=1)
+    records = [
+        attendance('A', 'present', '2024-01-15T10:00:00Z'),
+        attendance('B', 'present'),
+        attendance('A', 'excused'),
+        attendance('A', 'absent', '2024-01-15T09:00:00Z'),
+    ]
+
+    output = list(compactor.compact(records))
+
+    assert [r['status'] for r in output if r['studentRollNumber'] == 'A'] == ['present', 'excused']
+
+
+def test_field_merge_ignores_null_fields():
+    compactor = RecordCompactor.for_attendance(policy=RecordCompactor.FIELD_MERGE)
+    records = [
+        attendance('A', 'late', '2024-01-15T09:00:00Z', remarks='Bus delayed'),
+        attendance('A', 'present', '2024-01-15T10:00:00Z', remarks=None),
+        attendance('A', None, '2024-01-15T08:00:00Z', remarks='Stale remark'),
+    ]
+
+    output = list(compactor.compact(records))
+
+    assert len(output) == 1
+    assert output[0]['status'] == 'present'
+    assert output[0]['remarks'] == 'Bus delayed'
+    assert output[0]['updatedAt'] == '2024-01-15T10:00:00Z'
+
+
+def test_field_merge_omits_null_fields_across_windows():
+    compactor = RecordCompactor.for_attendance(policy=RecordCompactor.FIELD_MERGE, window_size=1)
+    records = [
+        attendance('A', 'late', '2024-01-15T09:00:00Z', remarks='Bus delayed'),
+        attendance('B', 'present'),
+        attendance('A', 'present', '2024-01-15T10:00:00Z', remarks=None),
+    ]
+
+    output = list(compactor.compact(records))
+
+    assert output[-1] == attendance('A', 'present', '2024-01-15T10:00:00Z')
+    assert 'remarks' not in output[-1]
+
+
+def test_records_without_key_pass_through():
+    compactor = RecordCompactor.for_attendance()
+    records = [{'status': 'present'}, {'status': 'present'}, attendance('A', 'present')]
+
+    output = list(compactor.compact(records))
+
+    assert len(output) == 3
+    assert compactor.stats['collapsed'] == 0
+
+
+def test_records_without_timestamp_use_arrival_order():
+    compactor = RecordCompactor.for_attendance()
+    records = [attendance('A', 'absent'), attendance('A', 'late'), attendance('A', 'present')]
+
+    output = list(compactor.compact(records))
+
+    assert [r['status'] for r in output] == ['present']
+
+
+def test_students_keyed_on_roll_number_then_email():
+    compactor = RecordCompactor.for_students()
+    records = [
+        {'rollNumber': 'SMS2024001', 'firstName': 'Ahmed'},
+        {'rollNumber': 'SMS2024001', 'firstName': 'Ahmad'},
+        {'email': 'Fatima@School.com', 'firstName': 'Fatima'},
+        {'email': 'fatima@school.com', 'firstName': 'Fatimah'},
+    ]
+
+    output = list(compactor.compact(records))
+
+    assert [r['firstName'] for r in output] == ['Ahmad', 'Fatimah']
+
+
+@pytest.mark.parametrize('older, newer', [
+    ('2024-01-15T08:00:00Z', '2024-01-15T09:00:00+00:00'),
+    ('2024-01-15T09:00:00+01:00', '2024-01-15T08:30:00Z'),
+    ('2024-01-15T08:00:00', '2024-01-15T09:00:00'),
+    (1705305600, 1705309200),
+    (1705305600000, 1705309200000),
+    (1705305600.5, '2024-01-15T09:00:00Z'),
+])
+def test_timestamp_formats(older, newer):
+    compactor = RecordCompactor.for_attendance()
+    records = [attendance('A', 'new', newer), attendance('A', 'old', older)]
+
+    output = list(compactor.compact(records))
+
+    assert [r['status'] for r in output] == ['new']
+
+
+def test_unparseable_timestamps_fall_back_to_arrival_order():
+    compactor = RecordCompactor.for_attendance()
+    records = [attendance('A', 'absent', 10 ** 20), attendance('A', 'present', 'yesterday')]
+
+    output = list(compactor.compact(records))
+
+    assert [r['status'] for r in output] == ['present']
+
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError):
+        RecordCompactor.for_attendance(policy='first_writer_wins')
+
+
+def test_negative_max_tracked_keys_is_rejected():
+    with pytest.raises(ValueError):
+        RecordCompactor.for_attendance(max_tracked_keys=-1)
+
+
+def test_stale_edit_accepted_once_key_is_evicted():
+    compactor = RecordCompactor.for_attendance(window_size=1, max_tracked_keys=1)
+    records = [
+        attendance('A', 'present', '2024-01-15T10:00:00Z'),
+        attendance('B', 'present', '2024-01-15T10:00:00Z'),
+        attendance('C', 'present', '2024-01-15T10:00:00Z'),
+        attendance('A', 'late', '2024-01-15T09:00:00Z'),
+    ]
+
+    output = list(compactor.compact(records))
+
+    assert [r['status'] for r in output if r['studentRollNumber'] == 'A'] == ['present', 'late']
+
+
+def test_reused_compactor_starts_fresh():
+    compactor = RecordCompactor.for_attendance()
+    records = [attendance('A', 'present', '2024-01-15T10:00:00Z')]
+
+    list(compactor.compact(records))
+    output = list(compactor.compact(records))
+
+    assert output == records
+    assert compactor.stats == {'input': 1, 'output': 1, 'collapsed': 0}
+
+
+def test_process_attendance_batch_reports_collapsed():
+    client = StubClient()
+    processor = BatchProcessor(client, batch_size=2)
+    records = [
+        attendance('A', 'absent', '2024-01-15T08:00:00Z'),
+        attendance('B', 'present', '2024-01-15T08:00:00Z'),
+        attendance('A', 'present', '2024-01-15T09:00:00Z'),
+        attendance('C', 'present', '2024-01-15T08:00:00Z'),
+        attendance('B', 'late', '2024-01-15T07:00:00Z'),
+    ]
+
+    results = processor.process_attendance_batch(iter(records), compactor=RecordCompactor.for_attendance())
+
+    assert results['collapsed'] == 2
+    assert results['created'] == 3
+    assert [len(batch) for batch in client.batches] == [2, 1]
+
+
+def test_process_attendance_batch_without_compactor():
+    client = StubClient(fail_batches=(2,))
+    processor = BatchProcessor(client, batch_size=2)
+    records = [attendance('A', 'absent'), attendance('A', 'present'), attendance('B', 'present')]
+
+    results = processor.process_attendance_batch(records)
+
+    assert results['collapsed'] == 0
+    assert results['created'] == 2
+    assert results['errors'] == ['Batch 2: Server unavailable']
+
+
+def test_failed_batch_is_resent_on_retry():
+    client = StubClient(fail_batches=(1,))
+    processor = BatchProcessor(client, batch_size=2)
+    compactor = RecordCompactor.for_attendance()
+    records = [
+        attendance('A', 'present', '2024-01-15T10:00:00Z'),
+        attendance('B', 'present', '2024-01-15T10:00:00Z'),
+    ]
+
+    first = processor.process_attendance_batch(records, compactor=compactor)
+    retry = processor.process_attendance_batch(records, compactor=compactor)
+
+    assert first['errors'] == ['Batch 1: Server unavailable']
+    assert retry['created'] == 2
+    assert retry['collapsed'] == 0
+    assert client.batches[-1] == records
+
+
+def test_process_students_batch_reports_collapsed():
+    client = StubClient()
+    processor = BatchProcessor(client, batch_size=10)
+    students = [
+        {'rollNumber': 'SMS2024001', 'firstName': 'Ahmed', 'updatedAt': '2024-01-15T08:00:00Z'},
+        {'rollNumber': 'SMS2024001', 'firstName': 'Ahmad', 'updatedAt': '2024-01-15T09:00:00Z'},
+        {'email': 'fatima@school.com', 'firstName': 'Fatima'},
+    ]
+
+    results = processor.process_students_batch(students, compactor=RecordCompactor.for_students())
+
+    assert results['collapsed'] == 1
+    assert results['created'] == 2
+    assert [s['firstName'] for s in client.batches[0]] == ['Ahmad', 'Fatima']